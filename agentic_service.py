@@ -1,14 +1,29 @@
+import logging
+
 class ServiceResult:
     """Simple result object to mimic CrewAI result structure"""
+    __slots__ = ("original_text", "reversed_text", "raw", "_json")
+
     def __init__(self, original_text: str, reversed_text: str):
         self.original_text = original_text
         self.reversed_text = reversed_text
         self.raw = reversed_text
-        self.json_dict = {
-            "original_text": original_text,
-            "reversed_text": reversed_text,
-            "task": "reverse_echo"
-        }
+        self._json = None
+
+    @property
+    def json_dict(self) -> dict:
+        """Result as a dict, built on first access"""
+        if self._json is None:
+            self._json = {
+                "original_text": self.original_text,
+                "reversed_text": self.reversed_text,
+                "task": "reverse_echo"
+            }
+        return self._json
+
+    @json_dict.setter
+    def json_dict(self, value: dict):
+        self._json = value
 
 class AgenticService:
     """Simple service that reverses input text"""
@@ -20,6 +35,19 @@ class AgenticService:
         """
         Execute reverse echo task
         
+        Args:
+            input_data: Dictionary containing 'input_string' key
+            
+        Returns:
+            ServiceResult with reversed text
+        """
+        # same work as execute_task_sync, for callers that expect a coroutine
+        return self.execute_task_sync(input_data)
+    
+    def execute_task_sync(self, input_data: dict) -> ServiceResult:
+        """
+        Execute reverse echo task without creating a coroutine
+        
         Args:
             input_data: Dictionary containing 'input_string' key
             
@@ -27,15 +55,19 @@ class AgenticService:
             ServiceResult with reversed text
         """
         text = input_data.get("input_string", "")
+        # skip building the truncated previews when INFO records would be dropped
+        logger = self.logger
+        if logger is not None and not logger.isEnabledFor(logging.INFO):
+            logger = None
         
-        if self.logger:
-            self.logger.info(f"Processing reverse echo for text: '{text[:50]}{'...' if len(text) > 50 else ''}'")
+        if logger is not None:
+            logger.info("Processing reverse echo for text: '%s%s'", text[:50], '...' if len(text) > 50 else '')
         
         # simple reverse operation
         reversed_text = text[::-1]
         
-        if self.logger:
-            self.logger.info(f"Reverse echo completed: '{reversed_text[:50]}{'...' if len(reversed_text) > 50 else ''}'")
+        if logger is not None:
+            logger.info("Reverse echo completed: '%s%s'", reversed_text[:50], '...' if len(reversed_text) > 50 else '')
         
         return ServiceResult(text, reversed_text)
 
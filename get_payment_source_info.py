@@ -9,8 +9,9 @@ import json
 import os
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (set MASUMI_SKIP_DOTENV=1 when the environment is already populated)
+if os.getenv("MASUMI_SKIP_DOTENV", "").lower() not in ("1", "true", "yes"):
+    load_dotenv()
 
 def get_payment_source_info():
     """Get payment source information from the payment service"""
@@ -39,32 +40,33 @@ def get_payment_source_info():
                 payment_sources = data.get("data", {}).get("PaymentSources", [])
                 print(f"\n📄 Found {len(payment_sources)} payment sources")
                 
-                for source in payment_sources:
-                    network = source.get("network")
-                    print(f"\n📄 Network: {network}")
-                    
-                    if network == "Preprod":
-                        selling_wallets = source.get("SellingWallets", [])
-                        print(f"📄 Found {len(selling_wallets)} selling wallets")
-                        
-                        if selling_wallets:
-                            wallet = selling_wallets[0]
-                            wallet_addr = wallet.get("walletAddress")
-                            wallet_vkey = wallet.get("walletVkey")
-                            
-                            print("\n✅ SELLER WALLET INFORMATION:")
-                            print(f"   Address: {wallet_addr}")
-                            print(f"   VKey: {wallet_vkey}")
-                            print("\n📝 Add this to your .env file:")
-                            print(f"   SELLER_VKEY={wallet_vkey}")
-                            
-                            return {
-                                "wallet_address": wallet_addr,
-                                "vkey": wallet_vkey
-                            }
+                # stop at the first Preprod source that has a selling wallet
+                wallet = next(
+                    (
+                        source["SellingWallets"][0]
+                        for source in payment_sources
+                        if source.get("network") == "Preprod" and source.get("SellingWallets")
+                    ),
+                    None
+                )
                 
-                print("❌ No Preprod selling wallets found")
-                return None
+                if wallet is None:
+                    print("❌ No Preprod selling wallets found")
+                    return None
+                
+                wallet_addr = wallet.get("walletAddress")
+                wallet_vkey = wallet.get("walletVkey")
+                
+                print("\n✅ SELLER WALLET INFORMATION:")
+                print(f"   Address: {wallet_addr}")
+                print(f"   VKey: {wallet_vkey}")
+                print("\n📝 Add this to your .env file:")
+                print(f"   SELLER_VKEY={wallet_vkey}")
+                
+                return {
+                    "wallet_address": wallet_addr,
+                    "vkey": wallet_vkey
+                }
             else:
                 print(f"❌ Payment source request failed: {data}")
                 return None
@@ -1,14 +1,17 @@
 import os
+import json
+import asyncio
 import uvicorn
 import uuid
 import time
+from dataclasses import dataclass
 from urllib.parse import urlparse
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from pydantic import BaseModel
 from masumi.config import Config
 from masumi.payment import Payment
-from agentic_service import get_agentic_service
+from agentic_service import get_agentic_service, ServiceResult
 from logging_config import setup_logging
 import cuid2
 
@@ -16,8 +19,9 @@ import cuid2
 # Configure logging
 logger = setup_logging()
 
-# Load environment variables
-load_dotenv(override=True)
+# Load environment variables (set MASUMI_SKIP_DOTENV=1 when the environment is already populated)
+if os.getenv("MASUMI_SKIP_DOTENV", "").lower() not in ("1", "true", "yes"):
+    load_dotenv(override=True)
 
 # Retrieve API Keys and URLs
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -25,6 +29,21 @@ PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL", "")
 PAYMENT_API_KEY = os.getenv("PAYMENT_API_KEY", "")
 NETWORK = os.getenv("NETWORK", "preview")
 
+# Payment amounts are parsed once here instead of on every /start_job call
+try:
+    PAYMENT_AMOUNT = int(os.getenv("PAYMENT_AMOUNT", "1000000"))  # 1 ADA
+except ValueError:
+    PAYMENT_AMOUNT = None
+PAYMENT_UNIT = os.getenv("PAYMENT_UNIT", "lovelace") # Default lovelace
+# seconds between payment status sweeps; each sweep is a full, paginated payment listing
+MIN_PAYMENT_POLL_INTERVAL = 5
+try:
+    PAYMENT_POLL_INTERVAL = int(os.getenv("PAYMENT_POLL_INTERVAL", "60"))
+except ValueError:
+    PAYMENT_POLL_INTERVAL = None
+if PAYMENT_POLL_INTERVAL is not None and PAYMENT_POLL_INTERVAL < MIN_PAYMENT_POLL_INTERVAL:
+    PAYMENT_POLL_INTERVAL = None
+
 logger.info("Starting application with configuration:")
 logger.info(f"PAYMENT_SERVICE_URL: {PAYMENT_SERVICE_URL}")
 
@@ -69,6 +88,12 @@ def validate_environment():
     if not NETWORK:
         errors.append("NETWORK is not set")
     
+    if PAYMENT_AMOUNT is None:
+        errors.append(f"PAYMENT_AMOUNT must be an integer (got: '{os.getenv('PAYMENT_AMOUNT')}')")
+    
+    if PAYMENT_POLL_INTERVAL is None:
+        errors.append(f"PAYMENT_POLL_INTERVAL must be an integer of at least {MIN_PAYMENT_POLL_INTERVAL} seconds (got: '{os.getenv('PAYMENT_POLL_INTERVAL')}')")
+    
     if errors:
         logger.error("Critical environment variable validation failed:")
         for error in errors:
@@ -95,11 +120,34 @@ app = FastAPI(
 #region Temporary in-memory job store 
 # DO NOT USE IN PRODUCTION)
 # ─────────────────────────────────────────────────────────────────────────────
-jobs = {}
+@dataclass(slots=True)
+class Job:
+    """In-memory record of a job and its payment"""
+    status: str
+    payment_status: str | None
+    payment_id: str
+    input_data: dict
+    identifier_from_purchaser: str
+    result: ServiceResult | None = None
+    error: str | None = None
+
+jobs: dict[str, Job] = {}
 payment_instances = {}
+# payments still waiting for confirmation: payment_id -> job_id
+pending_payments = {}
 
-# track server start time for uptime calculation
-server_start_time = time.time()
+# events used to wake long-polling /status requests when a job changes
+job_events = {}
+TERMINAL_JOB_STATUSES = frozenset({"completed", "failed"})
+
+def notify_job_update(job_id: str) -> None:
+    """Wake any /status requests waiting on this job"""
+    event = job_events.pop(job_id, None)
+    if event is not None:
+        event.set()
+
+# track server start time for uptime calculation (monotonic, so clock adjustments cannot skew it)
+server_start_time = time.monotonic()
 
 # ─────────────────────────────────────────────────────────────────────────────
 #region Initialize Masumi Payment Config
@@ -128,14 +176,32 @@ class StartJobRequest(BaseModel):
 class ProvideInputRequest(BaseModel):
     job_id: str
 
+# documents the bodies of the two polled endpoints in the OpenAPI schema; they are
+# declared as responses rather than response_model so responses are not re-validated
+class StatusResponse(BaseModel):
+    job_id: str
+    status: str
+    payment_status: str | None
+    result: str | None
+
+class AvailabilityResponse(BaseModel):
+    status: str
+    uptime: int
+    message: str
+
 # ─────────────────────────────────────────────────────────────────────────────
 #region Task Execution THIS IS THE MAIN ENTRY POINT
 # ─────────────────────────────────────────────────────────────────────────────
-async def execute_agentic_task(input_data: dict) -> object:
+async def execute_agentic_task(input_data: dict) -> ServiceResult:
     """ Execute task """
-    logger.info(f"starting task with input: {input_data}")
+    logger.debug("starting task with input: %s", input_data)
     service = get_agentic_service(logger=logger)
-    result = await service.execute_task(input_data)
+    # services with no I/O provide execute_task_sync, which skips creating a coroutine per job
+    execute_task_sync = getattr(service, "execute_task_sync", None)
+    if execute_task_sync is not None:
+        result = execute_task_sync(input_data)
+    else:
+        result = await service.execute_task(input_data)
     logger.info("task completed successfully")
     return result
 
@@ -145,8 +211,7 @@ async def execute_agentic_task(input_data: dict) -> object:
 @app.post("/start_job")
 async def start_job(data: StartJobRequest):
     """ Initiates a job and creates a payment request """
-    print(f"Received data: {data}")
-    print(f"Received data.input_data: {data.input_data}")
+    logger.debug("Received data: %s", data)
     try:
         job_id = str(uuid.uuid4())
         
@@ -196,11 +261,21 @@ async def start_job(data: StartJobRequest):
         logger.info(f"Received job request with input: '{truncated_input}'")
         logger.info(f"Starting job {job_id} with agent {agent_identifier}")
 
-        # Define payment amounts
-        payment_amount = int(os.getenv("PAYMENT_AMOUNT", "1000000"))  # 1 ADA
-        payment_unit = os.getenv("PAYMENT_UNIT", "lovelace") # Default lovelace
+        if PAYMENT_AMOUNT is None:
+            logger.error("PAYMENT_AMOUNT environment variable is not a valid integer")
+            raise HTTPException(
+                status_code=500,
+                detail="Server configuration error: Invalid PAYMENT_AMOUNT value. Please contact administrator."
+            )
+
+        if PAYMENT_POLL_INTERVAL is None:
+            logger.error("PAYMENT_POLL_INTERVAL environment variable is not a valid interval")
+            raise HTTPException(
+                status_code=500,
+                detail="Server configuration error: Invalid PAYMENT_POLL_INTERVAL value. Please contact administrator."
+            )
 
-        logger.info(f"Using payment amount: {payment_amount} {payment_unit}")
+        logger.info(f"Using payment amount: {PAYMENT_AMOUNT} {PAYMENT_UNIT}")
         
         # create config after validation
         config = Config(
@@ -225,22 +300,19 @@ async def start_job(data: StartJobRequest):
         logger.info(f"Created payment request with ID: {payment_id}")
 
         # Store job info (Awaiting payment)
-        jobs[job_id] = {
-            "status": "awaiting_payment",
-            "payment_status": "pending",
-            "payment_id": payment_id,
-            "input_data": input_data_dict,
-            "result": None,
-            "identifier_from_purchaser": identifier_from_purchaser
-        }
-
-        async def payment_callback(payment_id: str):
-            await handle_payment_status(job_id, payment_id)
+        jobs[job_id] = Job(
+            status="awaiting_payment",
+            payment_status="pending",
+            payment_id=payment_id,
+            input_data=input_data_dict,
+            identifier_from_purchaser=identifier_from_purchaser
+        )
 
-        # Start monitoring the payment status
+        # Hand the payment to the shared status poller
         payment_instances[job_id] = payment
+        pending_payments[payment_id] = job_id
         logger.info(f"Starting payment status monitoring for job {job_id}")
-        await payment.start_status_monitoring(payment_callback)
+        ensure_payment_poller()
 
         # Get SELLER_VKEY from environment
         seller_vkey = os.getenv("SELLER_VKEY", "")
@@ -274,11 +346,6 @@ async def start_job(data: StartJobRequest):
         raise
     except ValueError as e:
         logger.error(f"Value error in start_job: {str(e)}", exc_info=True)
-        if "PAYMENT_AMOUNT" in str(e):
-            raise HTTPException(
-                status_code=500,
-                detail="Server configuration error: Invalid PAYMENT_AMOUNT value. Please contact administrator."
-            )
         raise HTTPException(
             status_code=400,
             detail=f"Invalid input data: {str(e)}"
@@ -311,13 +378,15 @@ async def handle_payment_status(job_id: str, payment_id: str) -> None:
         logger.info(f"Payment {payment_id} completed for job {job_id}, executing task...")
         
         # Update job status to running
-        jobs[job_id]["status"] = "running"
-        input_data = jobs[job_id]["input_data"]
-        logger.info(f"Input data: {input_data}")
+        job = jobs[job_id]
+        job.status = "running"
+        notify_job_update(job_id)
+        input_data = job.input_data
+        logger.debug("Input data: %s", input_data)
 
         # Execute the AI task
         result = await execute_agentic_task(input_data)
-        result_dict = result.json_dict  # type: ignore
+        result_dict = result.json_dict
         logger.info(f"task completed for job {job_id}")
         
         # Mark payment as completed on Masumi
@@ -326,68 +395,137 @@ async def handle_payment_status(job_id: str, payment_id: str) -> None:
         logger.info(f"Payment completed for job {job_id}")
 
         # Update job status
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["payment_status"] = "completed"
-        jobs[job_id]["result"] = result
-
-        # Stop monitoring payment status
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
+        job.status = "completed"
+        job.payment_status = "completed"
+        job.result = result
+        notify_job_update(job_id)
+
+        # Payment is settled, the instance is no longer needed
+        payment_instances.pop(job_id, None)
     except Exception as e:
         logger.error(f"Error processing payment {payment_id} for job {job_id}: {str(e)}", exc_info=True)
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
+        jobs[job_id].status = "failed"
+        jobs[job_id].error = str(e)
+        notify_job_update(job_id)
         
-        # Still stop monitoring to prevent repeated failures
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
+        # Drop the instance so the job is not processed again
+        payment_instances.pop(job_id, None)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#region Shared Payment Status Poller
+# ─────────────────────────────────────────────────────────────────────────────
+# One background task checks all pending payments, instead of one Masumi
+# start_status_monitoring loop per job. Each loop listed every payment on the
+# network, so N pending jobs meant N full listings per interval.
+payment_poller_task = None
+# jobs dispatched by the poller, referenced here so they are not garbage collected mid-run
+payment_job_tasks = set()
+
+def is_payment_confirmed(payment: dict) -> bool:
+    """Same completion rule as masumi's Payment.start_status_monitoring"""
+    on_chain_state = payment.get("onChainState")
+    next_action = (payment.get("NextAction") or {}).get("requestedAction")
+    return on_chain_state in ("FundsLocked", "Complete") or next_action in ("PaymentComplete", "None")
+
+async def check_pending_payments() -> None:
+    """Run one status sweep and dispatch every newly confirmed payment"""
+    if not pending_payments:
+        return
+
+    # the listing covers all payments on the network, so any pending job's instance can fetch it
+    any_job_id = next(iter(pending_payments.values()))
+    result = await payment_instances[any_job_id].check_payment_status()
+    payments = result.get("data", {}).get("Payments", [])
+    logger.info("Payment status sweep: %s pending, %s listed", len(pending_payments), len(payments))
+
+    for payment in payments:
+        payment_id = payment.get("blockchainIdentifier")
+        job_id = pending_payments.get(payment_id)
+        if job_id is None or not is_payment_confirmed(payment):
+            continue
+        del pending_payments[payment_id]
+        # record the confirmation now: the job may run for a long time, or fail, before complete_payment
+        jobs[job_id].payment_status = "confirmed"
+        logger.info("Payment %s confirmed for job %s (on-chain state: %s)", payment_id, job_id, payment.get("onChainState"))
+
+        # each job runs as its own task, so a slow agent task never holds up the next sweep
+        task = asyncio.create_task(handle_payment_status(job_id, payment_id))
+        payment_job_tasks.add(task)
+        task.add_done_callback(on_payment_job_done)
+
+def on_payment_job_done(task: asyncio.Task) -> None:
+    """Forget a finished job task and log any error that escaped it"""
+    payment_job_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Unhandled error in payment job task", exc_info=task.exception())
+
+async def poll_payments() -> None:
+    """Sweep pending payments until none are left"""
+    interval = PAYMENT_POLL_INTERVAL
+    if interval is None:
+        # start_job refuses jobs while the interval is invalid, so there is nothing to poll
+        logger.error("Payment poller not started: PAYMENT_POLL_INTERVAL is invalid")
+        return
+    while pending_payments:
+        try:
+            await check_pending_payments()
+        except Exception as e:
+            logger.error("Error during payment status sweep: %s", e, exc_info=True)
+        if pending_payments:
+            await asyncio.sleep(interval)
+
+def ensure_payment_poller() -> None:
+    """Start the shared poller if it is not already running"""
+    global payment_poller_task
+    if payment_poller_task is None or payment_poller_task.done():
+        payment_poller_task = asyncio.create_task(poll_payments())
 
 # ─────────────────────────────────────────────────────────────────────────────
 #region 3) Check Job and Payment Status (MIP-003: /status)
 # ─────────────────────────────────────────────────────────────────────────────
-@app.get("/status")
-async def get_status(job_id: str):
+@app.get("/status", responses={200: {"model": StatusResponse}})
+async def get_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job status to change before responding"),
+    since_status: str | None = Query(None, description="Only wait while the job is still in this status")
+):
     """ Retrieves the current status of a specific job """
-    logger.info(f"Checking status for job {job_id}")
+    logger.debug("Checking status for job %s", job_id)
     if job_id not in jobs:
-        logger.warning(f"Job {job_id} not found")
+        logger.warning("Job %s not found", job_id)
         raise HTTPException(status_code=404, detail="Job not found")
 
     job = jobs[job_id]
 
-    # Check latest payment status if payment instance exists
-    if job_id in payment_instances:
+    # long-poll: hold the request until the job changes instead of making clients re-poll.
+    # a client passing the status it last saw gets an immediate answer if it already moved on
+    if (wait and job.status not in TERMINAL_JOB_STATUSES
+            and (since_status is None or job.status == since_status)):
+        event = job_events.setdefault(job_id, asyncio.Event())
         try:
-            status = await payment_instances[job_id].check_payment_status()
-            job["payment_status"] = status.get("data", {}).get("status")
-            logger.info(f"Updated payment status for job {job_id}: {job['payment_status']}")
-        except ValueError as e:
-            logger.warning(f"Error checking payment status: {str(e)}")
-            job["payment_status"] = "unknown"
-        except Exception as e:
-            logger.error(f"Error checking payment status: {str(e)}", exc_info=True)
-            job["payment_status"] = "error"
-
+            await asyncio.wait_for(event.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
 
-    result_data = job.get("result")
-    result = result_data.raw if result_data and hasattr(result_data, "raw") else None
+    # payment_status is set when the shared poller sees the payment confirmed and
+    # when complete_payment succeeds, so polls never trigger their own (full,
+    # paginated) payment service listing
+    result = job.result.raw if job.result else None
 
     return {
         "job_id": job_id,
-        "status": job["status"],
-        "payment_status": job["payment_status"],
+        "status": job.status,
+        "payment_status": job.payment_status,
         "result": result
     }
 
 # ─────────────────────────────────────────────────────────────────────────────
 #region 4) Check Server Availability (MIP-003: /availability)
 # ─────────────────────────────────────────────────────────────────────────────
-@app.get("/availability")
+@app.get("/availability", responses={200: {"model": AvailabilityResponse}})
 async def check_availability():
     """ Checks if the server is operational """
-    current_time = time.time()
+    current_time = time.monotonic()
     uptime_seconds = int(current_time - server_start_time)
     
     return {
@@ -399,37 +537,41 @@ async def check_availability():
 # ─────────────────────────────────────────────────────────────────────────────
 #region 5) Retrieve Input Schema (MIP-003: /input_schema)
 # ─────────────────────────────────────────────────────────────────────────────
+INPUT_SCHEMA = {
+    "input_data": [
+        {
+            "id": "input_string",
+            "type": "string",
+            "name": "Text to Reverse",
+            "data": {
+                "description": "The text input that will be reversed",
+                "placeholder": "Enter text to reverse here"
+            }
+        }
+    ]
+}
+# the schema never changes at runtime, so serialize it once at import
+INPUT_SCHEMA_JSON = json.dumps(INPUT_SCHEMA).encode()
+
 @app.get("/input_schema")
 async def input_schema():
     """
     Returns the expected input schema for the /start_job endpoint.
     Fulfills MIP-003 /input_schema endpoint.
     """
-    return {
-        "input_data": [
-            {
-                "id": "input_string",
-                "type": "string",
-                "name": "Text to Reverse",
-                "data": {
-                    "description": "The text input that will be reversed",
-                    "placeholder": "Enter text to reverse here"
-                }
-            }
-        ]
-    }
+    return Response(content=INPUT_SCHEMA_JSON, media_type="application/json")
 
 # ─────────────────────────────────────────────────────────────────────────────
 #region 6) Health Check
 # ─────────────────────────────────────────────────────────────────────────────
+HEALTH_JSON = json.dumps({"status": "healthy"}).encode()
+
 @app.get("/health")
 async def health():
     """
     Returns the health of the server.
     """
-    return {
-        "status": "healthy"
-    }
+    return Response(content=HEALTH_JSON, media_type="application/json")
 
 # ─────────────────────────────────────────────────────────────────────────────
 #region Main Logic if Called as a Script
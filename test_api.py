@@ -1,5 +1,6 @@
 import pytest
 import os
+import asyncio
 from fastapi.testclient import TestClient
 from unittest.mock import patch, AsyncMock, MagicMock
 import json
@@ -12,12 +13,36 @@ os.environ["NETWORK"] = "preview"
 os.environ["AGENT_IDENTIFIER"] = "test-agent-123"
 os.environ["SELLER_VKEY"] = "test-seller-vkey"
 
+import main
 from main import app
 from agentic_service import get_agentic_service, AgenticService, ServiceResult
 
 client = TestClient(app)
 
 
+def make_job(status="awaiting_payment", payment_status="pending"):
+    """build an in-memory job record without going through /start_job"""
+    return main.Job(
+        status=status,
+        payment_status=payment_status,
+        payment_id="test-payment-id",
+        input_data={"input_string": "Hello World"},
+        identifier_from_purchaser="test-cuid2-identifier"
+    )
+
+
+@pytest.fixture
+def job_store():
+    """isolate the in-memory job and payment stores, restoring them even if the test fails"""
+    stores = (main.jobs, main.payment_instances, main.pending_payments)
+    snapshots = [dict(store) for store in stores]
+    main.pending_payments.clear()
+    yield main
+    for store, snapshot in zip(stores, snapshots):
+        store.clear()
+        store.update(snapshot)
+
+
 class TestHealthEndpoints:
     """test basic health and info endpoints"""
     
@@ -52,10 +77,11 @@ class TestHealthEndpoints:
 class TestStartJobEndpoint:
     """test /start_job endpoint functionality"""
     
+    @patch('main.ensure_payment_poller')
     @patch('main.Payment')
     @patch('main.cuid2.Cuid')
     @patch.dict(os.environ, {"AGENT_IDENTIFIER": "test-agent-123", "SELLER_VKEY": "test-seller-vkey"})
-    def test_start_job_success(self, mock_cuid, mock_payment_class):
+    def test_start_job_success(self, mock_cuid, mock_payment_class, mock_ensure_poller, job_store):
         """test successful job creation"""
         # mock cuid2 generation
         mock_cuid_instance = MagicMock()
@@ -99,6 +125,10 @@ class TestStartJobEndpoint:
         # verify input_data was converted to dict
         expected_input = {"input_string": "Hello World"}
         assert call_args["input_data"] == expected_input
+        
+        # verify the payment was handed to the shared poller
+        assert main.pending_payments["test-blockchain-id"] == data["job_id"]
+        mock_ensure_poller.assert_called_once()
     
     def test_start_job_missing_input_data(self):
         """test job creation with missing input_data"""
@@ -139,6 +169,36 @@ class TestStartJobEndpoint:
         assert response.status_code == 400
         assert "input_string" in response.json()["detail"]
     
+    @patch('main.PAYMENT_AMOUNT', None)
+    @patch.dict(os.environ, {"AGENT_IDENTIFIER": "test-agent-123", "SELLER_VKEY": "test-seller-vkey"})
+    def test_start_job_invalid_payment_amount(self):
+        """test job creation when PAYMENT_AMOUNT failed to parse at startup"""
+        test_data = {
+            "input_data": [
+                {"key": "input_string", "value": "Hello World"}
+            ]
+        }
+        
+        response = client.post("/start_job", json=test_data)
+        
+        assert response.status_code == 500
+        assert "PAYMENT_AMOUNT" in response.json()["detail"]
+    
+    @patch('main.PAYMENT_POLL_INTERVAL', None)
+    @patch.dict(os.environ, {"AGENT_IDENTIFIER": "test-agent-123", "SELLER_VKEY": "test-seller-vkey"})
+    def test_start_job_invalid_poll_interval(self):
+        """test job creation when PAYMENT_POLL_INTERVAL failed to parse at startup"""
+        test_data = {
+            "input_data": [
+                {"key": "input_string", "value": "Hello World"}
+            ]
+        }
+        
+        response = client.post("/start_job", json=test_data)
+        
+        assert response.status_code == 500
+        assert "PAYMENT_POLL_INTERVAL" in response.json()["detail"]
+    
     def test_url_validation_function(self):
         """test the URL validation function directly"""
         from main import validate_url
@@ -191,10 +251,11 @@ class TestStatusEndpoint:
         assert response.status_code == 404
         assert response.json()["detail"] == "Job not found"
     
+    @patch('main.ensure_payment_poller')
     @patch('main.Payment')
     @patch('main.cuid2.Cuid')
     @patch.dict(os.environ, {"AGENT_IDENTIFIER": "test-agent-123", "SELLER_VKEY": "test-seller-vkey"})
-    def test_status_job_found(self, mock_cuid, mock_payment_class):
+    def test_status_job_found(self, mock_cuid, mock_payment_class, mock_ensure_poller, job_store):
         """test status check for existing job"""
         # first create a job
         mock_cuid_instance = MagicMock()
@@ -239,6 +300,221 @@ class TestStatusEndpoint:
         assert status_data["status"] == "awaiting_payment"
         assert status_data["payment_status"] == "pending"
         assert status_data["result"] is None
+        # status is served from the job record, without a payment service round-trip
+        mock_payment_instance.check_payment_status.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_status_reports_confirmed_payment_while_running(self, job_store):
+        """test that a confirmed payment shows in /status while the task is still running"""
+        mock_payment_instance = AsyncMock()
+        mock_payment_instance.check_payment_status.return_value = {
+            "data": {"Payments": [{"blockchainIdentifier": "test-payment-id", "onChainState": "FundsLocked"}]}
+        }
+        main.jobs["confirmed-running"] = make_job()
+        main.payment_instances["confirmed-running"] = mock_payment_instance
+        main.pending_payments["test-payment-id"] = "confirmed-running"
+        
+        async def never_finish(input_data):
+            await asyncio.Event().wait()
+        
+        with patch('main.execute_agentic_task', side_effect=never_finish):
+            await main.check_pending_payments()
+            try:
+                await asyncio.sleep(0)
+                status_data = await main.get_status("confirmed-running", wait=0, since_status=None)
+            finally:
+                for task in main.payment_job_tasks:
+                    task.cancel()
+                await asyncio.gather(*main.payment_job_tasks, return_exceptions=True)
+        
+        assert status_data["status"] == "running"
+        assert status_data["payment_status"] == "confirmed"
+    
+    @pytest.mark.asyncio
+    async def test_status_reports_confirmed_payment_after_failure(self, job_store):
+        """test that a failed job still reports its confirmed payment"""
+        mock_payment_instance = AsyncMock()
+        mock_payment_instance.check_payment_status.return_value = {
+            "data": {"Payments": [{"blockchainIdentifier": "test-payment-id", "onChainState": None, "NextAction": {"requestedAction": "None"}}]}
+        }
+        main.jobs["confirmed-failed"] = make_job()
+        main.payment_instances["confirmed-failed"] = mock_payment_instance
+        main.pending_payments["test-payment-id"] = "confirmed-failed"
+        
+        with patch('main.execute_agentic_task', side_effect=RuntimeError("task failed")):
+            await main.check_pending_payments()
+            await asyncio.gather(*main.payment_job_tasks)
+        
+        status_data = await main.get_status("confirmed-failed", wait=0, since_status=None)
+        assert status_data["status"] == "failed"
+        assert status_data["payment_status"] == "confirmed"
+    
+    def test_status_long_poll_times_out(self, job_store):
+        """test that wait returns the unchanged job once the timeout expires"""
+        main.jobs["long-poll-timeout"] = make_job()
+        
+        response = client.get("/status?job_id=long-poll-timeout&wait=0.05")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "awaiting_payment"
+    
+    def test_status_long_poll_since_status_changed(self, job_store):
+        """test that wait returns immediately when the job already left since_status"""
+        main.jobs["long-poll-since"] = make_job(status="running", payment_status="completed")
+        
+        response = client.get("/status?job_id=long-poll-since&wait=30&since_status=awaiting_payment")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "running"
+    
+    def test_status_long_poll_rejects_long_wait(self):
+        """test that wait is capped at 60 seconds"""
+        response = client.get("/status?job_id=any&wait=61")
+        
+        assert response.status_code == 422
+    
+    @pytest.mark.asyncio
+    async def test_status_long_poll_wakes_on_update(self, job_store):
+        """test that a waiting status request returns as soon as the job changes"""
+        main.jobs["long-poll-wake"] = make_job(status="running", payment_status="completed")
+        
+        async def complete_job():
+            await asyncio.sleep(0.05)
+            main.jobs["long-poll-wake"].status = "completed"
+            main.notify_job_update("long-poll-wake")
+        
+        status_data, _ = await asyncio.wait_for(
+            asyncio.gather(main.get_status("long-poll-wake", wait=30, since_status="running"), complete_job()),
+            timeout=5
+        )
+        
+        assert status_data["status"] == "completed"
+
+
+class TestPaymentPoller:
+    """test the shared payment status poller"""
+    
+    def test_is_payment_confirmed(self):
+        """test the payment completion rule"""
+        from main import is_payment_confirmed
+        
+        assert is_payment_confirmed({"onChainState": "FundsLocked"})
+        assert is_payment_confirmed({"onChainState": "Complete"})
+        assert is_payment_confirmed({"onChainState": None, "NextAction": {"requestedAction": "None"}})
+        assert not is_payment_confirmed({"onChainState": None, "NextAction": {"requestedAction": "WaitingForExternalAction"}})
+        assert not is_payment_confirmed({"onChainState": None, "NextAction": None})
+    
+    @pytest.mark.asyncio
+    async def test_sweep_processes_only_confirmed_payments(self, job_store):
+        """test that one sweep dispatches confirmed payments and keeps the rest pending"""
+        mock_payment_instance = AsyncMock()
+        mock_payment_instance.check_payment_status.return_value = {
+            "data": {
+                "Payments": [
+                    {"blockchainIdentifier": "paid-id", "onChainState": "FundsLocked"},
+                    {"blockchainIdentifier": "waiting-id", "onChainState": None, "NextAction": {"requestedAction": "WaitingForExternalAction"}},
+                    {"blockchainIdentifier": "other-agent-id", "onChainState": "FundsLocked"}
+                ]
+            }
+        }
+        main.jobs.update({"paid-job": make_job(), "waiting-job": make_job()})
+        main.payment_instances.update({"paid-job": mock_payment_instance, "waiting-job": mock_payment_instance})
+        main.pending_payments.update({"paid-id": "paid-job", "waiting-id": "waiting-job"})
+        
+        with patch('main.handle_payment_status', new_callable=AsyncMock) as mock_handle:
+            await main.check_pending_payments()
+            await asyncio.gather(*main.payment_job_tasks)
+        
+        # one listing for all pending jobs
+        mock_payment_instance.check_payment_status.assert_awaited_once()
+        mock_handle.assert_awaited_once_with("paid-job", "paid-id")
+        assert main.pending_payments == {"waiting-id": "waiting-job"}
+        assert main.jobs["paid-job"].payment_status == "confirmed"
+        assert main.jobs["waiting-job"].payment_status == "pending"
+    
+    @pytest.mark.asyncio
+    async def test_sweep_handles_confirmed_payments_concurrently(self, job_store):
+        """test that payments confirmed in the same sweep are processed together"""
+        mock_payment_instance = AsyncMock()
+        mock_payment_instance.check_payment_status.return_value = {
+            "data": {
+                "Payments": [
+                    {"blockchainIdentifier": "paid-id-1", "onChainState": "FundsLocked"},
+                    {"blockchainIdentifier": "paid-id-2", "onChainState": "FundsLocked"}
+                ]
+            }
+        }
+        main.jobs.update({"paid-job-1": make_job(), "paid-job-2": make_job()})
+        main.payment_instances["paid-job-1"] = mock_payment_instance
+        main.pending_payments.update({"paid-id-1": "paid-job-1", "paid-id-2": "paid-job-2"})
+        
+        # each handler waits for the other to start, which only succeeds if they overlap
+        started = {"paid-job-1": asyncio.Event(), "paid-job-2": asyncio.Event()}
+        
+        async def fake_handle(job_id, payment_id):
+            started[job_id].set()
+            other = "paid-job-2" if job_id == "paid-job-1" else "paid-job-1"
+            await started[other].wait()
+        
+        with patch('main.handle_payment_status', side_effect=fake_handle):
+            await main.check_pending_payments()
+            await asyncio.wait_for(asyncio.gather(*main.payment_job_tasks), timeout=5)
+        
+        assert main.pending_payments == {}
+    
+    @pytest.mark.asyncio
+    async def test_slow_job_does_not_block_next_sweep(self, job_store):
+        """test that a job that never finishes does not hold up the next sweep"""
+        mock_payment_instance = AsyncMock()
+        mock_payment_instance.check_payment_status.return_value = {
+            "data": {"Payments": [{"blockchainIdentifier": "slow-id", "onChainState": "FundsLocked"}]}
+        }
+        main.jobs.update({"slow-job": make_job(), "next-job": make_job()})
+        main.payment_instances.update({"slow-job": mock_payment_instance, "next-job": mock_payment_instance})
+        main.pending_payments["slow-id"] = "slow-job"
+        
+        async def never_finish(job_id, payment_id):
+            await asyncio.Event().wait()
+        
+        with patch('main.handle_payment_status', side_effect=never_finish):
+            await asyncio.wait_for(main.check_pending_payments(), timeout=5)
+            slow_tasks = set(main.payment_job_tasks)
+            try:
+                await asyncio.sleep(0)
+                # the slow job is still running when the next payment is picked up
+                mock_payment_instance.check_payment_status.return_value = {
+                    "data": {"Payments": [{"blockchainIdentifier": "next-id", "onChainState": "FundsLocked"}]}
+                }
+                main.pending_payments["next-id"] = "next-job"
+                await asyncio.wait_for(main.check_pending_payments(), timeout=5)
+                
+                assert main.pending_payments == {}
+                assert not any(task.done() for task in slow_tasks)
+            finally:
+                for task in main.payment_job_tasks:
+                    task.cancel()
+                await asyncio.gather(*main.payment_job_tasks, return_exceptions=True)
+    
+    @pytest.mark.asyncio
+    async def test_job_task_errors_are_logged(self, job_store):
+        """test that an error escaping a job task is logged and the task released"""
+        mock_payment_instance = AsyncMock()
+        mock_payment_instance.check_payment_status.return_value = {
+            "data": {"Payments": [{"blockchainIdentifier": "broken-id", "onChainState": "FundsLocked"}]}
+        }
+        main.jobs["broken-job"] = make_job()
+        main.payment_instances["broken-job"] = mock_payment_instance
+        main.pending_payments["broken-id"] = "broken-job"
+        
+        with patch('main.handle_payment_status', side_effect=KeyError("broken-job")), \
+                patch.object(main.logger, 'error') as mock_error:
+            await main.check_pending_payments()
+            await asyncio.gather(*main.payment_job_tasks, return_exceptions=True)
+            await asyncio.sleep(0)
+        
+        mock_error.assert_called_once()
+        assert isinstance(mock_error.call_args[1]["exc_info"], KeyError)
+        assert not main.payment_job_tasks
 
 
 class TestOpenAPISchema:
@@ -262,6 +538,10 @@ class TestOpenAPISchema:
         assert "/input_schema" in paths
         assert "/health" in paths
         
+        # check polled endpoints declare their response models
+        status_schema = paths["/status"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert status_schema["$ref"].endswith("/StatusResponse")
+        
         # check start_job endpoint schema
         start_job_schema = paths["/start_job"]["post"]
         assert "requestBody" in start_job_schema
@@ -312,6 +592,33 @@ class TestAgenticService:
         assert result.raw == "dlrow olleh"
         assert result.json_dict["task"] == "reverse_echo"
     
+    def test_service_result_json_dict(self):
+        """test that json_dict is built on demand and can be overridden"""
+        result = ServiceResult("abc", "cba")
+        assert result.json_dict == {"original_text": "abc", "reversed_text": "cba", "task": "reverse_echo"}
+        assert result.json_dict is result.json_dict
+
+        result.json_dict = {"task": "custom"}
+        assert result.json_dict == {"task": "custom"}
+
+    def test_service_execute_task_sync(self):
+        """test that the sync entry point matches execute_task"""
+        service = get_agentic_service()
+        
+        result = service.execute_task_sync({"input_string": "hello world"})
+        
+        assert isinstance(result, ServiceResult)
+        assert result.reversed_text == "dlrow olleh"
+    
+    @pytest.mark.asyncio
+    async def test_execute_agentic_task_uses_sync_entry_point(self):
+        """test that the server skips the coroutine when the service offers execute_task_sync"""
+        with patch.object(AgenticService, 'execute_task', new_callable=AsyncMock) as mock_execute_task:
+            result = await main.execute_agentic_task({"input_string": "hello world"})
+        
+        mock_execute_task.assert_not_awaited()
+        assert result.reversed_text == "dlrow olleh"
+    
     @pytest.mark.asyncio
     async def test_service_empty_input(self):
         """test service with empty input"""